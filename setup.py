@@ -34,7 +34,6 @@ if __name__ == '__main__':
         package_dir={"": "src"},
         package_data={'llvm_installer': ['py.typed', 'release_tags.json']},
         install_requires=[
-            'packaging',
             'sys-detection',
             'downloadutil',
         ],
@@ -49,9 +48,22 @@ if __name__ == '__main__':
                 'codecheck',
                 'pycodestyle',
                 'mypy',
+                'orjson',
                 'PyGithub',
                 'twine',
-            ]
+            ],
+            # Faster gzip decompression when installing LLVM packages.
+            'isal': [
+                'isal',
+            ],
+            # Support for LLVM packages compressed with Zstandard (.tar.zst).
+            'zstd': [
+                'zstandard',
+            ],
+            # Extraction of downloaded archives using libarchive.
+            'libarchive': [
+                'libarchive-c',
+            ],
         },
         entry_points={
             'console_scripts': ['llvm-installer=llvm_installer.__main__:main'],
@@ -10,19 +10,27 @@
 # or implied. See the License for the specific language governing permissions and limitations
 # under the License.
 
+import functools
 import os
 import re
 import logging
-import json
+import operator
+import pickle
 import sys
 
 import sys_detection
 
-from packaging import version
-
 from sys_detection import SHORT_OS_NAME_REGEX_STR, is_compatible_os, local_sys_conf
 
-from typing import Optional, List, Union, Sequence, Tuple, Dict
+from typing import Optional, List, Union, Sequence, Tuple, Dict, Iterable, TYPE_CHECKING
+
+
+__all__ = [
+    'LlvmInstaller',
+    'LlvmPackageCollection',
+    'ParsedTag',
+    'TagParsingError',
+]
 
 
 ARCH_RE_STR = '|'.join(['x86_64', 'aarch64', 'arm64'])
@@ -31,10 +39,11 @@ DEFAULT_GITHUB_RELEASE_URL_PREFIX = 'https://github.com/yugabyte/build-clang/rel
 DEFAULT_PACKAGE_NAME_PREFIX = 'yb-llvm-'
 DEFAULT_PACKAGE_NAME_SUFFIX = '.tar.gz'
 
+# TAG_RE_STR describes a full tag. _tag_re_without_os_and_arch() is used with match(), so that old
+# tags with arbitrary trailing components (e.g. "-static") are still accepted.
 TAG_RE_WITHOUT_OS_AND_ARCH_COMPONENTS = [
-    r'^',
-    r'v(?P<version>[0-9.]+)',
-    r'(-(?P<version_suffix>[a-z0-9-]+))?',
+    r'v(?P<version>[0-9]+(?:[.][0-9]+)+)',
+    r'(?:-(?P<version_suffix>[a-z0-9]+(?:-[a-z0-9]+)*))?',
     r'-',
     r'(?P<timestamp>\d+)',
     r'-',
@@ -48,30 +57,156 @@ TAG_RE_STR = ''.join(TAG_RE_WITHOUT_OS_AND_ARCH_COMPONENTS + [
     rf'(?P<short_os_name_and_version>(?:{SHORT_OS_NAME_REGEX_STR})[0-9.]*)',
     r'-',
     rf'(?P<architecture>{ARCH_RE_STR})',
-    r'$'
 ])
 
 
 TAG_RE_GROUP_KEYS = re.findall(r'(?<=<)[a-z0-9_]+(?=>)', TAG_RE_STR)
 assert len(TAG_RE_GROUP_KEYS) == 6, "Expected to see 6 capture groups in regex " + TAG_RE_STR
 
-TAG_RE = re.compile(TAG_RE_STR)
-TAG_RE_WITHOUT_OS_AND_ARCH = re.compile(TAG_RE_WITHOUT_OS_AND_ARCH_RE_STR)
+
+# The regular expression is compiled on first use, so that importing this module is cheap for
+# callers that never parse old tags.
+@functools.lru_cache(maxsize=None)
+def _tag_re_without_os_and_arch() -> 're.Pattern[str]':
+    return re.compile(TAG_RE_WITHOUT_OS_AND_ARCH_RE_STR, re.ASCII)
+
+
+# TAG_RE and TAG_RE_WITHOUT_OS_AND_ARCH used to be module attributes compiled at import time. They
+# are still available for existing callers, anchored the same way as before, but only compiled on
+# first access.
+_COMPAT_TAG_RE_STRS = {
+    'TAG_RE': '^' + TAG_RE_STR + '$',
+    'TAG_RE_WITHOUT_OS_AND_ARCH': '^' + TAG_RE_WITHOUT_OS_AND_ARCH_RE_STR,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _compat_tag_re(name: str) -> 're.Pattern[str]':
+    return re.compile(_COMPAT_TAG_RE_STRS[name])
+
+
+if sys.version_info >= (3, 7) and not TYPE_CHECKING:
+    def __getattr__(name: str) -> 're.Pattern[str]':
+        if name in _COMPAT_TAG_RE_STRS:
+            return _compat_tag_re(name)
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+else:
+    # Module-level __getattr__ is only supported starting with Python 3.7. Type checkers see these
+    # assignments instead of __getattr__, so that they still reject misspelled module attributes.
+    TAG_RE = _compat_tag_re('TAG_RE')
+    TAG_RE_WITHOUT_OS_AND_ARCH = _compat_tag_re('TAG_RE_WITHOUT_OS_AND_ARCH')
+
 
 DEFAULT_SHORT_OS_NAME_AND_VERSION_FOR_OLD_BUILDS = 'centos7'
 DEFAULT_ARCHITECTURE_FOR_OLD_BUILDS = 'x86_64'
 
+# Used for parsing tags without running the regular expressions above.
+ARCH_SET = frozenset(ARCH_RE_STR.split('|'))
+SHORT_OS_NAME_SET = frozenset(SHORT_OS_NAME_REGEX_STR.split('|'))
+
+DECIMAL_DIGITS = frozenset('0123456789')
+VERSION_CHARS_STR = '0123456789.'
+# This allows _is_short_os_name_and_version to find the OS name by stripping the version.
+assert not any(os_name.endswith(tuple(VERSION_CHARS_STR)) for os_name in SHORT_OS_NAME_SET)
+VERSION_SUFFIX_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789')
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+# Bump this whenever the pickled representation of LlvmPackageCollection or ParsedTag changes, so
+# that caches written by older versions of this module are ignored.
+RELEASE_TAGS_CACHE_FORMAT_VERSION = 5
+
 
 def get_release_tags_file_path() -> str:
     return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'release_tags.json')
 
 
+def get_release_tags_cache_file_path() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'release_tags.pkl')
+
+
 class TagParsingError(Exception):
     def __init__(self, msg: str) -> None:
         super(TagParsingError, self).__init__(msg)
 
 
+def _is_short_os_name_and_version(s: str) -> bool:
+    return s.rstrip(VERSION_CHARS_STR) in SHORT_OS_NAME_SET
+
+
+def _split_tag_parts(
+        parts: List[str], num_os_parts: int) -> Optional[Dict[str, Optional[str]]]:
+    num_trailing_parts = num_os_parts + 3
+    if len(parts) < num_trailing_parts + 1:
+        return None
+    short_os_name_and_version = '-'.join(parts[-num_os_parts - 1:-1])
+    sha1_prefix = parts[-num_os_parts - 2]
+    timestamp = parts[-num_os_parts - 3]
+    if (not _is_short_os_name_and_version(short_os_name_and_version) or
+            not sha1_prefix or not HEX_DIGITS.issuperset(sha1_prefix) or
+            not timestamp or not DECIMAL_DIGITS.issuperset(timestamp)):
+        return None
+
+    version_with_v = parts[0]
+    if not version_with_v.startswith('v'):
+        return None
+    version_components = version_with_v[1:].split('.')
+    if len(version_components) < 2:
+        return None
+    for version_component in version_components:
+        if not version_component or not DECIMAL_DIGITS.issuperset(version_component):
+            return None
+    version_suffix: Optional[str] = None
+    if len(parts) > num_trailing_parts + 1:
+        suffix_parts = parts[1:-num_trailing_parts]
+        for suffix_part in suffix_parts:
+            if not suffix_part or not VERSION_SUFFIX_CHARS.issuperset(suffix_part):
+                return None
+        version_suffix = '-'.join(suffix_parts)
+
+    return dict(
+        version=version_with_v[1:],
+        version_suffix=version_suffix,
+        timestamp=timestamp,
+        sha1_prefix=sha1_prefix,
+        short_os_name_and_version=short_os_name_and_version,
+        architecture=parts[-1])
+
+
+def _split_tag(tag: str) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Splits a tag of the form v<version>[-<version_suffix>]-<timestamp>-<sha1_prefix>-<os>-<arch>
+    into the same fields that a full match of TAG_RE_STR would capture, without running the regular
+    expression. Returns None for exactly those tags that TAG_RE_STR does not fully match, including
+    old tags without OS and architecture.
+    """
+    parts = tag.split('-')
+    if parts[-1] not in ARCH_SET:
+        return None
+    # Some OS names contain a dash (e.g. opensuse-leap). TAG_RE_STR prefers the longest version
+    # suffix, and therefore the shortest OS name and version, so try one part first.
+    return _split_tag_parts(parts, 1) or _split_tag_parts(parts, 2)
+
+
 class ParsedTag:
+    __slots__ = (
+        'tag',
+        'version',
+        'version_suffix',
+        'timestamp',
+        'sha1_prefix',
+        'short_os_name_and_version',
+        'architecture',
+        'major_version',
+        'minor_version',
+        'patch_version',
+        'yb_suffix_version',
+        'is_old_tag_without_os_and_arch',
+        'timestamp_int',
+        '_version_tuple',
+        '_sort_key',
+    )
+
     tag: str
 
     version: str
@@ -88,9 +223,17 @@ class ParsedTag:
 
     is_old_tag_without_os_and_arch: bool
 
+    timestamp_int: int
+    _version_tuple: Tuple[int, int, int, int, int]
+    _sort_key: Tuple[Union[str, int], ...]
+
     ATTR_NAMES = TAG_RE_GROUP_KEYS + [
         'tag', 'major_version', 'minor_version', 'patch_version', 'yb_suffix_version',
         'is_old_tag_without_os_and_arch']
+    assert set(ATTR_NAMES) <= set(__slots__)
+
+    _ATTR_GETTER = operator.attrgetter(*ATTR_NAMES)
+    _REPR_FMT = 'ParsedTag(' + ', '.join([f'{k}=%r' for k in ATTR_NAMES]) + ')'
 
     def __init__(self) -> None:
         pass
@@ -125,19 +268,47 @@ class ParsedTag:
             assert self.short_os_name_and_version is not None
             assert self.architecture is not None
 
+        self.intern_strings()
+
+        self.timestamp_int = int(self.timestamp)
+        self._version_tuple = (
+            self.major_version,
+            self.minor_version,
+            self.patch_version,
+            self.yb_suffix_version or 0,
+            self.timestamp_int
+        )
+        self._sort_key = (
+            self.major_version,
+            self.short_os_name_and_version,
+            self.architecture,
+            self.timestamp,
+            self.sha1_prefix,
+            self.tag,
+            self.version_suffix or ''
+        )
+
+    def intern_strings(self) -> None:
+        # There are only a few distinct values of these, and they are compared a lot when filtering.
+        self.short_os_name_and_version = sys.intern(self.short_os_name_and_version)
+        self.architecture = sys.intern(self.architecture)
+
     @staticmethod
     def from_tag(tag: str) -> 'ParsedTag':
         parsed_tag = ParsedTag()
         parsed_tag.tag = tag
-        m = TAG_RE.match(tag)
         is_old_tag_without_os_and_arch = False
-        if not m:
-            m = TAG_RE_WITHOUT_OS_AND_ARCH.match(tag)
+        groups = _split_tag(tag)
+        if groups is None:
+            # _split_tag handles every tag that fully matches TAG_RE_STR, so only the regular
+            # expression for old tags needs to be tried here.
+            m = _tag_re_without_os_and_arch().match(tag)
             if not m:
                 raise TagParsingError(
                     f"Cannot parse tag: {tag}. Does not match regular expression: {TAG_RE_STR}")
             is_old_tag_without_os_and_arch = True
-        for k, v in m.groupdict().items():
+            groups = m.groupdict()
+        for k, v in groups.items():
             assert k in TAG_RE_GROUP_KEYS, \
                 f'Unexpected parsed tag group key: {k}, valid keys: {TAG_RE_GROUP_KEYS}'
             setattr(parsed_tag, k, v)
@@ -145,15 +316,7 @@ class ParsedTag:
         return parsed_tag
 
     def get_sort_key(self) -> Tuple[Union[str, int], ...]:
-        return (
-            self.major_version,
-            self.short_os_name_and_version,
-            self.architecture,
-            self.timestamp,
-            self.sha1_prefix,
-            self.tag,
-            self.version_suffix or ''
-        )
+        return self._sort_key
 
     def as_dict(self) -> Dict[str, Optional[str]]:
         return {
@@ -171,57 +334,163 @@ class ParsedTag:
         return parsed_tag
 
     def __repr__(self) -> str:
-        return 'ParsedTag(%s)' % ', '.join(
-            [f'{k}={repr(getattr(self, k))}' for k in ParsedTag.ATTR_NAMES]
-        )
+        return ParsedTag._REPR_FMT % ParsedTag._ATTR_GETTER(self)
 
     __str__ = __repr__
 
     def get_version_tuple(self) -> Tuple[int, int, int, int, int]:
-        return (
-            self.major_version,
-            self.minor_version,
-            self.patch_version,
-            self.yb_suffix_version or 0,
-            int(self.timestamp) if self.timestamp is not None else 0
-        )
+        return self._version_tuple
 
 
 class LlvmPackageCollection:
     parsed_tags: List[ParsedTag]
 
+    # Parsed tags grouped by (major LLVM version, architecture), so that filtering only has to
+    # check OS compatibility for a handful of candidates.
+    _by_major_arch: Dict[Tuple[int, str], List[ParsedTag]]
+
     _instance: Optional['LlvmPackageCollection'] = None
 
     def __init__(self, tags: Sequence[Union[str, ParsedTag]]):
+        """
+        Deprecated: accepts a mix of tag strings and parsed tags, and checks the type of every
+        element. Use from_tags or from_parsed instead.
+        """
         self.parsed_tags = [
             (tag if isinstance(tag, ParsedTag) else ParsedTag.from_tag(tag))
             for tag in tags
         ]
+        self._build_index()
+
+    @classmethod
+    def from_tags(cls, tags: Iterable[str]) -> 'LlvmPackageCollection':
+        """
+        Creates a collection by parsing the given tag strings.
+        """
+        return cls.from_parsed(list(map(ParsedTag.from_tag, tags)))
+
+    @classmethod
+    def from_parsed(cls, parsed_tags: Iterable[ParsedTag]) -> 'LlvmPackageCollection':
+        """
+        Creates a collection from tags that are already parsed, without per-element type checks.
+        """
+        collection = cls.__new__(cls)
+        collection.parsed_tags = list(parsed_tags)
+        collection._build_index()
+        return collection
+
+    def _build_index(self) -> None:
+        self._by_major_arch = {}
+        for parsed_tag in self.parsed_tags:
+            self._by_major_arch.setdefault(
+                (parsed_tag.major_version, parsed_tag.architecture), []).append(parsed_tag)
+        # Keep each bucket sorted by version, so that the result of filter() is sorted too and the
+        # highest version is at the end.
+        for bucket in self._by_major_arch.values():
+            bucket.sort(key=ParsedTag.get_version_tuple)
 
     @classmethod
     def get_instance(self) -> 'LlvmPackageCollection':
         if not LlvmPackageCollection._instance:
-            with open(get_release_tags_file_path()) as release_tags_file:
-                json_data = json.load(release_tags_file)
-                parsed_tags: List[ParsedTag] = []
-                for json_data_for_tag in json_data['parsed_tags']:
-                    parsed_tag = ParsedTag.from_dict(json_data_for_tag)
-                    parsed_tags.append(parsed_tag)
-            LlvmPackageCollection._instance = LlvmPackageCollection(parsed_tags)
+            json_path = get_release_tags_file_path()
+            cache_path = get_release_tags_cache_file_path()
+            json_stat = os.stat(json_path)
+            cache_key = (json_stat.st_mtime_ns, json_stat.st_size)
+            collection = LlvmPackageCollection.load_from_cache(cache_path, cache_key)
+            if collection is None:
+                collection = LlvmPackageCollection.load_from_json(json_path)
+                collection.save_to_cache(cache_path, cache_key)
+            LlvmPackageCollection._instance = collection
         return LlvmPackageCollection._instance
 
+    @staticmethod
+    def load_from_json(json_path: str) -> 'LlvmPackageCollection':
+        with open(json_path, 'rb') as release_tags_file:
+            json_bytes = release_tags_file.read()
+        # The JSON file is only parsed when the pickle cache is missing or stale, so the parser is
+        # imported on demand. orjson is used if it is installed, because it is several times faster.
+        try:
+            import orjson  # type: ignore
+            json_data = orjson.loads(json_bytes)
+        except ImportError:
+            import json
+            json_data = json.loads(json_bytes)
+        parsed_tags: List[ParsedTag] = []
+        for json_data_for_tag in json_data['parsed_tags']:
+            parsed_tag = ParsedTag.from_dict(json_data_for_tag)
+            parsed_tags.append(parsed_tag)
+        return LlvmPackageCollection.from_parsed(parsed_tags)
+
+    @staticmethod
+    def load_from_cache(
+            cache_path: str,
+            cache_key: Tuple[int, int]) -> Optional['LlvmPackageCollection']:
+        """
+        Loads a collection previously saved with save_to_cache. Returns None if the cache file does
+        not exist, cannot be read, or was written by a different format version or for a different
+        cache key (modification time and size of the JSON file).
+        """
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                format_version, saved_cache_key, collection = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError,
+                TypeError, ValueError) as ex:
+            logging.debug("Ignoring unreadable release tags cache %s: %s", cache_path, ex)
+            return None
+        if (format_version != RELEASE_TAGS_CACHE_FORMAT_VERSION or
+                tuple(saved_cache_key) != cache_key or
+                not isinstance(collection, LlvmPackageCollection)):
+            return None
+        collection._intern_strings()
+        return collection
+
+    def _intern_strings(self) -> None:
+        """
+        Unpickled strings are not interned, so intern the OS and architecture strings of a
+        collection loaded from the cache, including those in the index keys.
+        """
+        for parsed_tag in self.parsed_tags:
+            parsed_tag.intern_strings()
+        self._by_major_arch = {
+            (major_version, sys.intern(architecture)): bucket
+            for (major_version, architecture), bucket in self._by_major_arch.items()
+        }
+
+    def save_to_cache(self, cache_path: str, cache_key: Tuple[int, int]) -> None:
+        """
+        Atomically writes this collection to the given cache file. Failures are ignored, e.g. when
+        the package is installed into a read-only directory.
+        """
+        tmp_path = '%s.tmp.%d' % (cache_path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as cache_file:
+                pickle.dump(
+                    (RELEASE_TAGS_CACHE_FORMAT_VERSION, cache_key, self),
+                    cache_file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as ex:
+            logging.debug("Could not write release tags cache %s: %s", cache_path, ex)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
     def filter(
             self,
             major_llvm_version: int,
             short_os_name_and_version: str,
             architecture: str) -> 'LlvmPackageCollection':
-        return LlvmPackageCollection([
-            parsed_tag for parsed_tag in self.parsed_tags
-            if parsed_tag.version.startswith(str(major_llvm_version) + '.') and
+        candidates = self._by_major_arch.get((major_llvm_version, architecture), [])
+        return self.from_parsed([
+            parsed_tag for parsed_tag in candidates
+            # is_compatible_os runs two regular expression matches, so skip it for an exact match.
+            if parsed_tag.short_os_name_and_version == short_os_name_and_version or
             is_compatible_os(
                 parsed_tag.short_os_name_and_version,
-                short_os_name_and_version) and
-            parsed_tag.architecture == architecture
+                short_os_name_and_version)
         ])
 
     def one_per_line_str(self, indent: int = 4) -> str:
@@ -242,6 +511,7 @@ class LlvmInstaller:
     github_release_url_prefix: str
     package_name_prefix: str
     package_name_suffix: str
+    _url_fmt: str
 
     def __init__(
             self,
@@ -251,10 +521,10 @@ class LlvmInstaller:
             package_name_prefix: Optional[str] = None,
             package_name_suffix: Optional[str] = None) -> None:
 
-        self.short_os_name_and_version = (
+        self.short_os_name_and_version = sys.intern(
             short_os_name_and_version or local_sys_conf().short_os_name_and_version()
         )
-        self.architecture = architecture or local_sys_conf().architecture
+        self.architecture = sys.intern(architecture or local_sys_conf().architecture)
 
         self.github_release_url_prefix = (
             github_release_url_prefix or DEFAULT_GITHUB_RELEASE_URL_PREFIX)
@@ -264,19 +534,33 @@ class LlvmInstaller:
         self.package_name_prefix = package_name_prefix or DEFAULT_PACKAGE_NAME_PREFIX
         self.package_name_suffix = package_name_suffix or DEFAULT_PACKAGE_NAME_SUFFIX
 
-    def get_url_for_tag(self, tag: str) -> str:
-        return ''.join([
-            self.github_release_url_prefix,
-            '/',
-            tag,
-            '/',
-            self.package_name_prefix,
-            tag,
-            self.package_name_suffix
+        # A format string with two %s placeholders for the tag.
+        self._url_fmt = '/'.join([
+            self.github_release_url_prefix.replace('%', '%%'),
+            '%s',
+            ''.join([
+                self.package_name_prefix.replace('%', '%%'),
+                '%s',
+                self.package_name_suffix.replace('%', '%%')
+            ])
         ])
 
+    def get_url_for_tag(self, tag: str) -> str:
+        return self._url_fmt % (tag, tag)
+
     def get_parsed_tag(self, major_llvm_version: int) -> ParsedTag:
         packages = LlvmPackageCollection.get_instance()
+
+        # Fast path for the common case of a single package for this major version and
+        # architecture.
+        candidates = packages._by_major_arch.get((major_llvm_version, self.architecture), [])
+        if len(candidates) == 1 and (
+                candidates[0].short_os_name_and_version == self.short_os_name_and_version or
+                is_compatible_os(
+                    candidates[0].short_os_name_and_version,
+                    self.short_os_name_and_version)):
+            return candidates[0]
+
         filtered_packages: LlvmPackageCollection = packages.filter(
             major_llvm_version=major_llvm_version,
             short_os_name_and_version=self.short_os_name_and_version,
@@ -289,19 +573,19 @@ class LlvmInstaller:
         parsed_tags = filtered_packages.parsed_tags
         if not parsed_tags:
             error_msg = f"Could not find an LLVM release for {selection_criteria_str}"
-            logging.warning(error_msg + ". Available packages:\n" + packages.one_per_line_str())
+            # Listing all available packages is expensive, so only do it if it will be logged.
+            if logging.getLogger().isEnabledFor(logging.WARNING):
+                logging.warning(
+                    "%s. Available packages:\n%s", error_msg, packages.one_per_line_str())
             raise ValueError(error_msg)
 
         if len(parsed_tags) == 1:
             return parsed_tags[0]
 
-        max_version_tuple = max([parsed_tag.get_version_tuple() for parsed_tag in parsed_tags])
-        highest_version_tags = [
-            parsed_tag for parsed_tag in parsed_tags
-            if parsed_tag.get_version_tuple() == max_version_tuple
-        ]
-        if len(highest_version_tags) == 1:
-            return highest_version_tags[0]
+        # The filtered tags are sorted by version, so only look for ties with the last one.
+        max_version_tuple = parsed_tags[-1].get_version_tuple()
+        if parsed_tags[-2].get_version_tuple() != max_version_tuple:
+            return parsed_tags[-1]
 
         raise ValueError(
             f"Multiple packages found for {selection_criteria_str} with the same "
@@ -15,69 +15,194 @@
 The command-line entry point to the llvm-installer Python module.
 """
 
-import argparse
+import functools
 import logging
 import os
-import subprocess
 import sys
-import time
-
-# TODO: figure out why py.typed from downloadutil is not being respected.
-from downloadutil.download_config import DownloadConfig  # type: ignore
-from downloadutil.downloader import Downloader  # type: ignore
 
 from llvm_installer import LlvmInstaller
-from sys_detection import local_sys_conf
+from llvm_installer.archive_types import STREAMABLE_ARCHIVE_EXTENSIONS, get_archive_extension
+from sys_detection import SysConfiguration, local_sys_conf
+
+from typing import List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+INSTALL_PARENT_DIR = '/opt/yb-build/llvm'
 
-from typing import Optional
+
+@functools.lru_cache(maxsize=1)
+def _cached_sys_conf() -> SysConfiguration:
+    return local_sys_conf()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_installer() -> LlvmInstaller:
+    """
+    Returns an installer for the local system, so that repeated main() invocations in the same
+    process do not probe the system again.
+    """
+    sys_conf = _cached_sys_conf()
+    return LlvmInstaller(
+        short_os_name_and_version=sys_conf.short_os_name_and_version(),
+        architecture=sys_conf.architecture)
+
+
+def download_and_extract(llvm_url: str, archive_extension: str, install_parent_dir: str) -> None:
+    """
+    Extracts the archive at the given URL while it is being downloaded, without saving the archive
+    itself to disk. The archive is extracted into a temporary directory, and its contents are only
+    moved into the parent directory once the checksum of the downloaded data has been verified.
+    Raises ChecksumMismatchError if the checksum does not match.
+    """
+    # These modules are only needed for installation, not for e.g. printing the URL.
+    import concurrent.futures
+    import io
+    import shutil
+    import tempfile
+
+    from llvm_installer.download import (
+        QueueReader,
+        check_sha256,
+        download_expected_sha256,
+        open_url,
+    )
+    from llvm_installer.extraction import BUFFER_SIZE_BYTES, extract_archive_stream
+
+    tmp_dir = tempfile.mkdtemp(prefix='.llvm-installer-tmp-', dir=install_parent_dir)
+    try:
+        # Download the checksum file in parallel with the archive.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            expected_sha256_future = executor.submit(download_expected_sha256, llvm_url)
+            with open_url(llvm_url) as response, QueueReader(response) as queue_reader:
+                extract_archive_stream(
+                    io.BufferedReader(queue_reader, buffer_size=BUFFER_SIZE_BYTES),
+                    archive_extension,
+                    tmp_dir)
+                actual_sha256 = queue_reader.read_to_end_and_get_sha256()
+            check_sha256(llvm_url, actual_sha256, expected_sha256_future.result())
+        logger.info("Successfully verified the checksum of %s: %s", llvm_url, actual_sha256)
+
+        for file_name in os.listdir(tmp_dir):
+            dest_path = os.path.join(install_parent_dir, file_name)
+            # Replace any previous, possibly incomplete, installation.
+            if os.path.isdir(dest_path) and not os.path.islink(dest_path):
+                shutil.rmtree(dest_path)
+            elif os.path.lexists(dest_path):
+                os.remove(dest_path)
+            os.rename(os.path.join(tmp_dir, file_name), dest_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 def install(llvm_url: str, once: bool, verbose: bool) -> None:
+    # Check whether LLVM is already installed before importing or initializing anything that is only
+    # needed for downloading and extracting it.
     archive_name = os.path.basename(llvm_url)
-    install_dir_name = None
-    for extension in ['.zip', '.tar.gz']:
-        if archive_name.endswith(extension):
-            install_dir_name = archive_name[:-len(extension)]
-            break
-    if not install_dir_name:
+    archive_extension = get_archive_extension(archive_name)
+    if not archive_extension or archive_name == archive_extension:
         raise ValueError("Could not determine installation directory name from URL %s" % llvm_url)
+    install_dir_name = archive_name[:-len(archive_extension)]
 
-    install_parent_dir = '/opt/yb-build/llvm'
+    install_parent_dir = INSTALL_PARENT_DIR
     install_dir = os.path.join(install_parent_dir, install_dir_name)
 
-    # We create a "flag file" to indicate that the installation has successfuly completed. Another
-    # approach would have been to extract to a temporary directory and then try to atomically move
-    # it into place. That would require a bit more error handling.
+    # We create a "flag file" to indicate that the installation has successfuly completed. The
+    # archive is only moved into place after its checksum has been verified, but a previous
+    # installation could still have been interrupted while moving files or writing the flag file.
     flag_file_path = os.path.join(install_dir, '.llvm_installation_finished')
     if once and os.path.exists(flag_file_path):
-        logging.info("LLVM is already installed in %s" % install_dir)
+        logger.info("LLVM is already installed in %s", install_dir)
         return
 
-    start_time_sec = time.time()
-    config = DownloadConfig(verbose=verbose)
-    downloader = Downloader(config=config)
-    logging.info("Downloading %s", llvm_url)
-    downloaded_path = downloader.download_url(
-        llvm_url,
-        verify_checksum=True,
-        download_parent_dir_path=install_parent_dir)
-    download_time_sec = time.time() - start_time_sec
-    logging.info("Downloaded in %.3f sec", download_time_sec)
-    extract_start_time_sec = time.time()
-    logging.info("Extracting %s in %s", archive_name, install_parent_dir)
-    subprocess.check_call(['tar', 'xzf', archive_name], cwd=install_parent_dir)
-    extract_time_sec = time.time() - extract_start_time_sec
-    logging.info("Extracted in %.3f sec", extract_time_sec)
-
-    with open(flag_file_path, 'w') as output_file:
-        pass
+    import time
 
-    if os.path.exists(downloaded_path):
+    from llvm_installer.download import ChecksumMismatchError
+
+    os.makedirs(install_parent_dir, exist_ok=True)
+    start_time_sec = time.perf_counter()
+    if archive_extension in STREAMABLE_ARCHIVE_EXTENSIONS:
+        logger.info("Downloading and extracting %s in %s", llvm_url, install_parent_dir)
         try:
+            download_and_extract(llvm_url, archive_extension, install_parent_dir)
+        except ChecksumMismatchError as ex:
+            logger.warning("%s. Downloading the archive to disk and trying again.", ex)
+            install_from_downloaded_archive(llvm_url, install_parent_dir, verbose=verbose)
+    else:
+        install_from_downloaded_archive(llvm_url, install_parent_dir, verbose=verbose)
+    logger.info("Downloaded and extracted in %.3f sec", time.perf_counter() - start_time_sec)
+
+    os.close(os.open(flag_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+
+
+def install_from_downloaded_archive(llvm_url: str, install_parent_dir: str, verbose: bool) -> None:
+    """
+    The slower way of installing LLVM: download the archive to disk, verify its checksum, and only
+    then extract it.
+    """
+    import concurrent.futures
+    import time
+
+    from llvm_installer.download import check_sha256, download_expected_sha256, download_file
+    from llvm_installer.extraction import extract_archive
+
+    start_time_sec = time.perf_counter()
+    downloaded_path = os.path.join(install_parent_dir, os.path.basename(llvm_url))
+    logger.info("Downloading %s to %s", llvm_url, downloaded_path)
+    # Download the checksum file in parallel with the archive, and compute the checksum of the
+    # archive while downloading it.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        expected_sha256_future = executor.submit(download_expected_sha256, llvm_url)
+        actual_sha256 = download_file(llvm_url, downloaded_path)
+        try:
+            check_sha256(llvm_url, actual_sha256, expected_sha256_future.result())
+        except BaseException:
             os.remove(downloaded_path)
-        except FileNotFoundError as ex:
-            # Someone else deleted the file (but it should not really happen).
-            pass
+            raise
+    download_time_sec = time.perf_counter() - start_time_sec
+    if verbose and logger.isEnabledFor(logging.INFO):
+        logger.info("Successfully verified the checksum of %s: %s", llvm_url, actual_sha256)
+        logger.info(
+            "Downloaded %d bytes in %.3f sec",
+            os.path.getsize(downloaded_path), download_time_sec)
+    else:
+        logger.info("Downloaded in %.3f sec", download_time_sec)
+    extract_start_time_sec = time.perf_counter()
+    logger.info("Extracting %s in %s", downloaded_path, install_parent_dir)
+    extract_archive(downloaded_path, install_parent_dir)
+    extract_time_sec = time.perf_counter() - extract_start_time_sec
+    logger.info("Extracted in %.3f sec", extract_time_sec)
+
+    try:
+        os.remove(downloaded_path)
+    except FileNotFoundError:
+        # Someone else deleted the file (but it should not really happen).
+        pass
+
+
+MAJOR_VERSION_OPTION_NAMES = ('--llvm-major-version', '--major-version')
+
+
+def parse_print_url_args(args: List[str]) -> Optional[int]:
+    """
+    Recognizes the most common invocation, e.g. "--llvm-major-version 14 print-url", which is often
+    used in shell loops, so that it can be handled without building the argparse parser. Returns
+    the LLVM major version, or None if the arguments have to be parsed with argparse.
+    """
+    if len(args) == 3:
+        option_name, version_str, command = args
+    elif len(args) == 2 and '=' in args[0]:
+        (option_name, version_str), command = args[0].split('=', 1), args[1]
+    else:
+        return None
+    if (option_name not in MAJOR_VERSION_OPTION_NAMES or
+            command not in ('print-url', '--print-url') or
+            not version_str.isdigit()):
+        return None
+    major_version = int(version_str)
+    # Let argparse-based code report errors for invalid versions.
+    return major_version or None
 
 
 def main() -> None:
@@ -85,11 +210,19 @@ def main() -> None:
         level=logging.INFO,
         format="[llvm-installer %(filename)s:%(lineno)d] %(asctime)s %(levelname)s: %(message)s")
 
+    fast_path_major_version = parse_print_url_args(sys.argv[1:])
+    if fast_path_major_version is not None:
+        print(_get_installer().get_llvm_url(major_llvm_version=fast_path_major_version))
+        return
+
+    import argparse
+
     arg_parser = argparse.ArgumentParser(
         prog='llvm-installer',
         description=__doc__)
     arg_parser.add_argument(
         '--llvm-major-version', '--major-version',
+        type=int,
         help='LLVM major version')
     arg_parser.add_argument(
         '--print-url',
@@ -124,12 +257,6 @@ def main() -> None:
     args = arg_parser.parse_args()
     command: Optional[str] = args.command
 
-    sys_conf = local_sys_conf()
-    short_os_name_and_version = sys_conf.short_os_name_and_version()
-    installer = LlvmInstaller(
-        short_os_name_and_version=short_os_name_and_version,
-        architecture=sys_conf.architecture)
-
     should_print_url = command == 'print-url' or args.print_url
 
     should_install = command == 'install'
@@ -137,7 +264,7 @@ def main() -> None:
     if should_print_url or should_install:
         if not args.llvm_major_version:
             raise ValueError("--llvm-major-version not specified\n")
-        llvm_url = installer.get_llvm_url(major_llvm_version=args.llvm_major_version)
+        llvm_url = _get_installer().get_llvm_url(major_llvm_version=args.llvm_major_version)
 
     if should_print_url:
         print(llvm_url)
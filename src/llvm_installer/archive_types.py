@@ -0,0 +1,37 @@
+# Copyright (c) Yugabyte, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Supported archive types. This module is kept free of heavy imports, so that e.g. "install --once"
+can determine the installation directory without loading the extraction code.
+"""
+
+from typing import Optional
+
+
+ARCHIVE_EXTENSIONS = ('.tar', '.tar.gz', '.tar.zst', '.tar.xz', '.zip')
+
+# Archive types that are extracted while being downloaded. Uncompressed .tar archives are
+# downloaded to disk first instead, because the contents of their files can then be copied by the
+# kernel from the archive without passing through Python.
+STREAMABLE_ARCHIVE_EXTENSIONS = frozenset(['.tar.gz', '.tar.zst', '.tar.xz'])
+
+
+def get_archive_extension(archive_name: str) -> Optional[str]:
+    """
+    Returns the extension of the given archive file name, e.g. ".tar.gz", if it is one of the
+    supported archive types, or None otherwise.
+    """
+    for extension in ARCHIVE_EXTENSIONS:
+        if archive_name.endswith(extension):
+            return extension
+    return None
@@ -0,0 +1,181 @@
+# Copyright (c) Yugabyte, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Streaming downloads of LLVM packages with SHA256 checksum verification.
+"""
+
+import hashlib
+import io
+import queue
+import threading
+import urllib.request
+
+# TODO: figure out why py.typed from downloadutil is not being respected.
+from downloadutil.checksum_util import (  # type: ignore
+    get_sha256_file_path_or_url,
+    parse_sha256_from_file,
+)
+
+from typing import Any, BinaryIO, Optional
+
+
+# Some servers need this header in order to allow the download.
+REQUEST_HEADERS = {'user-agent': 'Mozilla'}
+
+MAX_CHECKSUM_FILE_SIZE_BYTES = 65536
+
+# Applies to connecting and to each blocking read, so that a stalled connection fails instead of
+# hanging the installation (and the QueueReader thread) forever.
+DOWNLOAD_TIMEOUT_SEC = 60
+
+DOWNLOAD_CHUNK_SIZE_BYTES = 1024 * 1024
+
+# Limits the downloaded data waiting to be extracted to 64 MiB.
+MAX_QUEUED_DOWNLOAD_CHUNKS = 64
+
+
+class ChecksumMismatchError(IOError):
+    def __init__(self, msg: str) -> None:
+        super(ChecksumMismatchError, self).__init__(msg)
+
+
+def check_sha256(url: str, actual_sha256: str, expected_sha256: str) -> None:
+    if actual_sha256 != expected_sha256:
+        raise ChecksumMismatchError(
+            f"Invalid checksum: {actual_sha256}, expected {expected_sha256} for data "
+            f"downloaded from {url}")
+
+
+def open_url(url: str, timeout_sec: float = DOWNLOAD_TIMEOUT_SEC) -> BinaryIO:
+    return urllib.request.urlopen(
+        urllib.request.Request(url, headers=REQUEST_HEADERS), timeout=timeout_sec)
+
+
+def download_expected_sha256(url: str, timeout_sec: float = DOWNLOAD_TIMEOUT_SEC) -> str:
+    """
+    Downloads the ".sha256" file corresponding to the given URL and returns the checksum from it.
+    """
+    checksum_url = get_sha256_file_path_or_url(url)
+    with open_url(checksum_url, timeout_sec=timeout_sec) as checksum_stream:
+        checksum_file_contents = checksum_stream.read(MAX_CHECKSUM_FILE_SIZE_BYTES + 1)
+    if len(checksum_file_contents) > MAX_CHECKSUM_FILE_SIZE_BYTES:
+        raise IOError(
+            f"The checksum file at {checksum_url} is too large (more than "
+            f"{MAX_CHECKSUM_FILE_SIZE_BYTES} bytes)")
+    sha256: str = parse_sha256_from_file(checksum_file_contents.decode('utf-8'))
+    return sha256
+
+
+def download_file(url: str, dest_path: str, timeout_sec: float = DOWNLOAD_TIMEOUT_SEC) -> str:
+    """
+    Downloads the given URL to the given file and returns the SHA256 checksum of the downloaded
+    data, which is computed while downloading instead of reading the file again afterwards.
+    """
+    sha256 = hashlib.sha256()
+    buffer = bytearray(DOWNLOAD_CHUNK_SIZE_BYTES)
+    with memoryview(buffer) as buffer_view:
+        with open_url(url, timeout_sec=timeout_sec) as response, \
+                open(dest_path, 'wb') as output_file:
+            while True:
+                num_bytes = response.readinto(buffer)  # type: ignore
+                if not num_bytes:
+                    break
+                chunk = buffer_view[:num_bytes]
+                sha256.update(chunk)
+                output_file.write(chunk)
+    return sha256.hexdigest()
+
+
+class QueueReader(io.RawIOBase):
+    """
+    A raw stream that reads the underlying stream, e.g. an HTTP response, on a background thread
+    and passes the data through a bounded queue, so that downloading overlaps with the
+    decompression and extraction of the data read from this stream. The SHA256 checksum of the
+    entire underlying stream is computed on the background thread too.
+    """
+
+    def __init__(
+            self,
+            input_stream: BinaryIO,
+            chunk_size: int = DOWNLOAD_CHUNK_SIZE_BYTES,
+            max_queued_chunks: int = MAX_QUEUED_DOWNLOAD_CHUNKS) -> None:
+        super(QueueReader, self).__init__()
+        self.input_stream = input_stream
+        self.chunk_size = chunk_size
+        self.sha256 = hashlib.sha256()
+        self.queue: 'queue.Queue[Optional[bytes]]' = queue.Queue(maxsize=max_queued_chunks)
+        self.error: Optional[BaseException] = None
+        self.stop_event = threading.Event()
+        self.current_chunk = memoryview(b'')
+        self.eof = False
+        self.thread = threading.Thread(
+            target=self._read_input_stream, name='llvm-installer-download', daemon=True)
+        self.thread.start()
+
+    def _read_input_stream(self) -> None:
+        try:
+            while not self.stop_event.is_set():
+                chunk = self.input_stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.sha256.update(chunk)
+                self.queue.put(chunk)
+        except BaseException as ex:
+            self.error = ex
+        finally:
+            self.queue.put(None)
+
+    def _get_next_chunk(self) -> bool:
+        chunk = self.queue.get()
+        if chunk is None:
+            self.eof = True
+            self.thread.join()
+            if self.error is not None:
+                raise self.error
+            return False
+        self.current_chunk = memoryview(chunk)
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if not self.current_chunk:
+            if self.eof or not self._get_next_chunk():
+                return 0
+        num_bytes = min(len(buffer), len(self.current_chunk))
+        with memoryview(buffer) as buffer_view:
+            buffer_view.cast('B')[:num_bytes] = self.current_chunk[:num_bytes]
+        self.current_chunk = self.current_chunk[num_bytes:]
+        return num_bytes
+
+    def read_to_end_and_get_sha256(self) -> str:
+        """
+        Waits for the rest of the underlying stream, e.g. padding after the end of a tar archive,
+        to be read, and returns the checksum of the entire stream.
+        """
+        self.current_chunk = memoryview(b'')
+        while not self.eof:
+            self._get_next_chunk()
+        return self.sha256.hexdigest()
+
+    def close(self) -> None:
+        # Make sure the background thread is not left blocked on a full queue, e.g. if extraction
+        # failed.
+        self.stop_event.set()
+        while not self.eof:
+            chunk = self.queue.get()
+            if chunk is None:
+                self.eof = True
+                self.thread.join()
+        super(QueueReader, self).close()
@@ -0,0 +1,536 @@
+# Copyright (c) Yugabyte, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+In-process extraction of downloaded LLVM archives.
+"""
+
+import errno
+import io
+import os
+import queue
+import tarfile
+import threading
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from llvm_installer.archive_types import ARCHIVE_EXTENSIONS, get_archive_extension
+
+# Intel ISA-L based gzip decompression is typically 2-3 times faster than zlib. This is an optional
+# dependency, see the "isal" extra in setup.py.
+GzipFile: Any
+try:
+    from isal.igzip import IGzipFile as GzipFile  # type: ignore
+except ImportError:
+    from gzip import GzipFile
+
+
+# Reading the archive and the decompressed stream in large chunks avoids many small reads.
+BUFFER_SIZE_BYTES = 1024 * 1024
+
+# The size of the chunks in which tarfile copies file contents from the archive. The default is
+# only 16 KiB, which means a lot of Python-level iterations for large binaries and libraries. Much
+# larger values do not help when reading a stream, because tarfile assembles every read from 10 KiB
+# records.
+TAR_COPY_BUFFER_SIZE_BYTES = 256 * 1024
+
+# Commands that decompress the file given as an argument to standard output, in the order of
+# preference for each archive type. pigz and xz -T0 use multiple threads. zstd decompression is
+# single-threaded, but still runs in parallel with the extraction. gzip is deliberately not listed:
+# it is slower than the in-process decompression with isal.
+DECOMPRESSOR_COMMANDS: Dict[str, List[List[str]]] = {
+    '.tar.gz': [['pigz', '-dc']],
+    '.tar.xz': [['xz', '-dc', '-T0']],
+    '.tar.zst': [['zstd', '-dcq']],
+}
+
+# Regular files up to this size are read into memory and written by a pool of threads. LLVM
+# archives contain tens of thousands of headers and other small files. Larger files, such as the
+# binaries and static libraries, are written by tarfile in chunks on the reading thread.
+MAX_THREADED_WRITE_SIZE_BYTES = 4 * 1024 * 1024
+NUM_WRITER_THREADS = 4
+# Bounds the amount of data read ahead of the writer threads.
+WRITE_QUEUE_SIZE = 32
+
+
+class UnsafeArchiveMemberError(tarfile.TarError):
+    def __init__(self, msg: str) -> None:
+        super(UnsafeArchiveMemberError, self).__init__(msg)
+
+
+def _is_outside_dest_dir(path: str, real_dest_dir_path: str) -> bool:
+    real_path = os.path.realpath(path)
+    return os.path.commonpath([real_dest_dir_path, real_path]) != real_dest_dir_path
+
+
+def _filter_tar_member(tar_info: tarfile.TarInfo, real_dest_dir_path: str) -> tarfile.TarInfo:
+    """
+    Refuses to extract members whose paths, or link targets, are outside of the destination
+    directory, like the tar command does. The archive is extracted before its checksum is verified,
+    so its contents cannot be trusted. The paths are resolved against the file system, so that
+    symlinks extracted earlier cannot be used to escape the destination, and the destination
+    directory path has to be resolved with os.path.realpath by the caller. On Python versions that
+    have tarfile.tar_filter (3.12 and some backports), it checks member paths, but it does not check
+    link targets. Otherwise, we do the same thing as tar_filter ourselves, including stripping
+    leading slashes, so that extraction behaves the same on every Python version.
+    """
+    if hasattr(tarfile, 'tar_filter'):
+        tar_info = tarfile.tar_filter(tar_info, real_dest_dir_path)
+    else:
+        if tar_info.name.startswith(('/', os.sep)):
+            tar_info.name = tar_info.name.lstrip('/' + os.sep)
+        if (os.path.isabs(tar_info.name) or
+                _is_outside_dest_dir(
+                    os.path.join(real_dest_dir_path, tar_info.name), real_dest_dir_path)):
+            raise UnsafeArchiveMemberError(
+                f"Refusing to extract {tar_info.name!r} outside of {real_dest_dir_path}")
+    if tar_info.islnk():
+        link_target_path = os.path.join(real_dest_dir_path, tar_info.linkname)
+    elif tar_info.issym():
+        link_target_path = os.path.join(
+            real_dest_dir_path, os.path.dirname(tar_info.name), tar_info.linkname)
+    else:
+        return tar_info
+    if (os.path.isabs(tar_info.linkname) or
+            _is_outside_dest_dir(link_target_path, real_dest_dir_path)):
+        raise UnsafeArchiveMemberError(
+            f"Refusing to extract link {tar_info.name!r} pointing to {tar_info.linkname!r} "
+            f"outside of {real_dest_dir_path}")
+    return tar_info
+
+
+def _configure_tar_file(tar_file: tarfile.TarFile) -> None:
+    if hasattr(tarfile, 'tar_filter'):
+        # Behave like the tar command: strip leading slashes and refuse to extract files outside of
+        # the destination directory.
+        tar_file.extraction_filter = tarfile.tar_filter
+    # This attribute is only used by Python 3.8 and later, and is ignored by older versions.
+    setattr(tar_file, 'copybufsize', TAR_COPY_BUFFER_SIZE_BYTES)
+
+
+def _set_file_attrs(
+        tar_file: tarfile.TarFile,
+        tar_info: tarfile.TarInfo,
+        target_path: str,
+        fd: int) -> None:
+    """
+    Sets the same attributes as tarfile does for every extracted file, but using the file
+    descriptor that is already open, so that the kernel does not have to resolve the path again
+    for each system call.
+    """
+    try:
+        tar_file.chown(tar_info, target_path, False)
+    except tarfile.ExtractError:
+        # Ignored by tarfile too with the default error level.
+        pass
+    if tar_info.mode is not None:
+        os.fchmod(fd, tar_info.mode)
+    if tar_info.mtime is not None:
+        os.utime(fd, (tar_info.mtime, tar_info.mtime))
+
+
+def _make_parent_dir(target_path: str, existing_dir_paths: Set[str]) -> None:
+    """
+    Creates the parent directory of the given path unless it is already in existing_dir_paths, so
+    that we only call makedirs once per directory rather than once per file. LLVM archives have
+    many files in few directories.
+    """
+    parent_dir_path = os.path.dirname(target_path)
+    if parent_dir_path not in existing_dir_paths:
+        os.makedirs(parent_dir_path, exist_ok=True)
+        existing_dir_paths.add(parent_dir_path)
+
+
+def _set_directory_attrs(
+        tar_file: tarfile.TarFile,
+        directories: List[tarfile.TarInfo],
+        dest_dir_path: str) -> None:
+    """
+    Like extractall, we set directory attributes at the end, because extracting files into a
+    directory modifies its timestamp.
+    """
+    directories.sort(key=lambda tar_info: tar_info.name, reverse=True)
+    for tar_info in directories:
+        dir_path = os.path.join(dest_dir_path, tar_info.name)
+        try:
+            tar_file.chown(tar_info, dir_path, False)
+            tar_file.utime(tar_info, dir_path)
+            tar_file.chmod(tar_info, dir_path)
+        except tarfile.ExtractError:
+            pass
+
+
+class _FileWriterPool:
+    """
+    Writes regular files extracted from a tar stream on a few worker threads, so that the thread
+    reading the stream does not have to wait for every open/write/close system call, which release
+    the GIL.
+    """
+
+    def __init__(self, tar_file: tarfile.TarFile, num_threads: int) -> None:
+        self.tar_file = tar_file
+        self.queue: 'queue.Queue[Optional[Tuple[tarfile.TarInfo, str, bytes]]]' = queue.Queue(
+            maxsize=WRITE_QUEUE_SIZE)
+        self.errors: List[BaseException] = []
+        self.threads = [
+            threading.Thread(target=self._run, name='llvm-installer-writer-%d' % i, daemon=True)
+            for i in range(num_threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _write_file(self, tar_info: tarfile.TarInfo, target_path: str, data: bytes) -> None:
+        fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with memoryview(data) as data_view:
+                offset = 0
+                while offset < len(data_view):
+                    offset += os.write(fd, data_view[offset:])
+            _set_file_attrs(self.tar_file, tar_info, target_path, fd)
+        finally:
+            os.close(fd)
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                # Keep consuming the queue after an error so that the reading thread never blocks.
+                if not self.errors:
+                    self._write_file(*item)
+            except BaseException as ex:
+                self.errors.append(ex)
+            finally:
+                self.queue.task_done()
+
+    def check_errors(self) -> None:
+        if self.errors:
+            raise self.errors[0]
+
+    def submit(self, tar_info: tarfile.TarInfo, target_path: str, data: bytes) -> None:
+        self.check_errors()
+        self.queue.put((tar_info, target_path, data))
+
+    def wait(self) -> None:
+        """
+        Waits for all files submitted so far to be written.
+        """
+        self.queue.join()
+        self.check_errors()
+
+    def shutdown(self) -> None:
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def extract_tar_stream(input_stream: io.BufferedIOBase, dest_dir_path: str) -> None:
+    """
+    Extracts an uncompressed tar stream into the given directory. The stream is read sequentially
+    and never seeked, so it can be e.g. the output of a decompressor. Regular files are written by
+    a pool of threads if there are multiple CPUs, while everything else is extracted by tarfile
+    itself on the current thread.
+    """
+    # Symlinks in the destination path would otherwise make every member look like it is outside.
+    dest_dir_path = os.path.realpath(dest_dir_path)
+    with tarfile.open(fileobj=input_stream, mode='r|') as tar_file:
+        _configure_tar_file(tar_file)
+
+        num_writer_threads = min(NUM_WRITER_THREADS, os.cpu_count() or 1)
+        if num_writer_threads < 2:
+            # With a single CPU, the writer threads only add overhead.
+            tar_file.extractall(
+                dest_dir_path,
+                members=(_filter_tar_member(tar_info, dest_dir_path) for tar_info in tar_file))
+            return
+
+        directories: List[tarfile.TarInfo] = []
+        # Directories known to exist, see _make_parent_dir.
+        existing_dir_paths: Set[str] = {dest_dir_path}
+        writer_pool = _FileWriterPool(tar_file, num_writer_threads)
+        try:
+            for tar_info in tar_file:
+                tar_info = _filter_tar_member(tar_info, dest_dir_path)
+                if tar_info.isreg() and tar_info.size <= MAX_THREADED_WRITE_SIZE_BYTES:
+                    file_obj = tar_file.extractfile(tar_info)
+                    assert file_obj is not None
+                    target_path = os.path.join(dest_dir_path, tar_info.name)
+                    _make_parent_dir(target_path, existing_dir_paths)
+                    writer_pool.submit(tar_info, target_path, file_obj.read())
+                    continue
+                if tar_info.islnk():
+                    # The hard link target has to be written before we can link to it.
+                    writer_pool.wait()
+                if tar_info.isdir():
+                    directories.append(tar_info)
+                    existing_dir_paths.add(os.path.join(dest_dir_path, tar_info.name))
+                tar_file.extract(tar_info, dest_dir_path, set_attrs=not tar_info.isdir())
+            writer_pool.wait()
+        finally:
+            writer_pool.shutdown()
+
+        _set_directory_attrs(tar_file, directories, dest_dir_path)
+
+
+def _copy_file_range(input_fd: int, output_fd: int, offset: int, size: int) -> None:
+    """
+    Copies the given range of the input file to the output file without passing the data through
+    user space, falling back to reading and writing the data if the kernel or filesystem does not
+    support copy_file_range.
+    """
+    end_offset = offset + size
+    try:
+        while offset < end_offset:
+            num_bytes = os.copy_file_range(
+                input_fd, output_fd, end_offset - offset, offset_src=offset)
+            if not num_bytes:
+                raise tarfile.ReadError("Unexpected end of data in tar archive")
+            offset += num_bytes
+    except OSError as ex:
+        if ex.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise
+        while offset < end_offset:
+            data = os.pread(input_fd, min(end_offset - offset, TAR_COPY_BUFFER_SIZE_BYTES), offset)
+            if not data:
+                raise tarfile.ReadError("Unexpected end of data in tar archive")
+            with memoryview(data) as data_view:
+                written = 0
+                while written < len(data_view):
+                    written += os.write(output_fd, data_view[written:])
+            offset += len(data)
+
+
+def extract_tar(input_stream: io.BufferedIOBase, dest_dir_path: str) -> None:
+    """
+    Extracts an uncompressed tar archive into the given directory. If the archive is a file on
+    disk, the contents of regular files are copied by the kernel with copy_file_range (Linux) from
+    their offsets in the archive, without reading them into Python. Otherwise, e.g. when the archive
+    is being downloaded, it is extracted as a stream.
+    """
+    try:
+        input_fd = input_stream.fileno()
+    except (OSError, ValueError):
+        input_fd = None
+    if (input_fd is None or not input_stream.seekable() or
+            not hasattr(os, 'copy_file_range')):
+        extract_tar_stream(input_stream, dest_dir_path)
+        return
+
+    # Symlinks in the destination path would otherwise make every member look like it is outside.
+    dest_dir_path = os.path.realpath(dest_dir_path)
+    with tarfile.open(fileobj=input_stream, mode='r:') as tar_file:
+        _configure_tar_file(tar_file)
+        directories: List[tarfile.TarInfo] = []
+        # Directories known to exist, see _make_parent_dir.
+        existing_dir_paths: Set[str] = {dest_dir_path}
+        for tar_info in tar_file:
+            tar_info = _filter_tar_member(tar_info, dest_dir_path)
+            if tar_info.isreg() and not tar_info.issparse():
+                target_path = os.path.join(dest_dir_path, tar_info.name)
+                _make_parent_dir(target_path, existing_dir_paths)
+                fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                try:
+                    _copy_file_range(input_fd, fd, tar_info.offset_data, tar_info.size)
+                    _set_file_attrs(tar_file, tar_info, target_path, fd)
+                finally:
+                    os.close(fd)
+                continue
+            if tar_info.isdir():
+                directories.append(tar_info)
+                existing_dir_paths.add(os.path.join(dest_dir_path, tar_info.name))
+            tar_file.extract(tar_info, dest_dir_path, set_attrs=not tar_info.isdir())
+        _set_directory_attrs(tar_file, directories, dest_dir_path)
+
+
+def extract_tar_gz_stream(input_stream: io.BufferedIOBase, dest_dir_path: str) -> None:
+    """
+    Decompresses a .tar.gz stream and extracts it into the given directory in a single pass.
+    """
+    with GzipFile(fileobj=input_stream, mode='rb') as gzip_file:
+        extract_tar_stream(
+            io.BufferedReader(gzip_file, buffer_size=BUFFER_SIZE_BYTES),  # type: ignore
+            dest_dir_path)
+
+
+def extract_tar_xz_stream(input_stream: io.BufferedIOBase, dest_dir_path: str) -> None:
+    """
+    Decompresses a .tar.xz stream and extracts it into the given directory in a single pass.
+    """
+    import lzma
+
+    with lzma.LZMAFile(input_stream, mode='rb') as lzma_file:  # type: ignore
+        extract_tar_stream(
+            io.BufferedReader(lzma_file, buffer_size=BUFFER_SIZE_BYTES),  # type: ignore
+            dest_dir_path)
+
+
+def extract_tar_zst_stream(input_stream: io.BufferedIOBase, dest_dir_path: str) -> None:
+    """
+    Decompresses a .tar.zst stream and extracts it into the given directory in a single pass. This
+    requires the optional zstandard module, see the "zstd" extra in setup.py.
+    """
+    try:
+        import zstandard  # type: ignore
+    except ImportError as ex:
+        raise ImportError(
+            "The zstandard module is required to extract .tar.zst archives. Please install the "
+            "llvm-installer[zstd] extra.") from ex
+
+    with zstandard.ZstdDecompressor().stream_reader(input_stream) as zstd_reader:
+        extract_tar_stream(
+            io.BufferedReader(zstd_reader, buffer_size=BUFFER_SIZE_BYTES), dest_dir_path)
+
+
+def extract_zip(input_stream: io.BufferedIOBase, dest_dir_path: str) -> None:
+    """
+    Extracts a .zip archive into the given directory. The stream has to be seekable, because the
+    list of files is at the end of a zip archive.
+    """
+    import zipfile
+
+    with zipfile.ZipFile(input_stream) as zip_file:
+        for zip_info in zip_file.infolist():
+            extracted_path = zip_file.extract(zip_info, dest_dir_path)
+            # zipfile does not restore permissions. Unix zip tools store them in the upper 16 bits
+            # of the external attributes.
+            mode = (zip_info.external_attr >> 16) & 0o7777
+            if mode and not zip_info.is_dir():
+                os.chmod(extracted_path, mode)
+
+
+# Maps supported archive file name extensions to the functions extracting them.
+ARCHIVE_HANDLERS: Dict[str, Callable[[io.BufferedIOBase, str], None]] = {
+    '.tar': extract_tar,
+    '.tar.gz': extract_tar_gz_stream,
+    '.tar.zst': extract_tar_zst_stream,
+    '.tar.xz': extract_tar_xz_stream,
+    '.zip': extract_zip,
+}
+assert set(ARCHIVE_HANDLERS) == set(ARCHIVE_EXTENSIONS)
+
+
+def extract_archive_stream(
+        input_stream: io.BufferedIOBase,
+        archive_extension: str,
+        dest_dir_path: str) -> None:
+    """
+    Extracts an archive of the type determined by the given extension, e.g. ".tar.gz", from a
+    stream into the given directory.
+    """
+    ARCHIVE_HANDLERS[archive_extension](input_stream, dest_dir_path)
+
+
+def extract_archive_with_libarchive(archive_path: str, dest_dir_path: str) -> bool:
+    """
+    Extracts an archive of any supported type into the given directory using libarchive, which
+    does the reading, decompression and writing in C. This requires the optional libarchive-c
+    module, see the "libarchive" extra in setup.py. Returns False if it is not available.
+    """
+    try:
+        import libarchive  # type: ignore
+        import libarchive.extract  # type: ignore
+    except (ImportError, OSError, AttributeError):
+        # OSError and AttributeError mean that the libarchive shared library could not be loaded.
+        return False
+
+    flags = (
+        libarchive.extract.EXTRACT_PERM |
+        libarchive.extract.EXTRACT_TIME |
+        libarchive.extract.EXTRACT_SECURE_NOABSOLUTEPATHS |
+        libarchive.extract.EXTRACT_SECURE_NODOTDOT |
+        libarchive.extract.EXTRACT_SECURE_SYMLINKS)
+    if os.geteuid() == 0:
+        # Same as tarfile and the tar command.
+        flags |= libarchive.extract.EXTRACT_OWNER
+
+    archive_path = os.path.abspath(archive_path)
+    # libarchive always extracts into the current directory.
+    original_cwd = os.getcwd()
+    os.chdir(dest_dir_path)
+    try:
+        with libarchive.file_reader(archive_path, block_size=BUFFER_SIZE_BYTES) as entries:
+            libarchive.extract.extract_entries(entries, flags)
+    finally:
+        os.chdir(original_cwd)
+    return True
+
+
+def get_decompressor_command(archive_extension: str) -> Optional[List[str]]:
+    """
+    Returns the first available command from DECOMPRESSOR_COMMANDS for the given archive type, or
+    None if there is none.
+    """
+    import shutil
+
+    for command in DECOMPRESSOR_COMMANDS.get(archive_extension, []):
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+def extract_archive_with_decompressor_process(
+        archive_path: str,
+        archive_extension: str,
+        dest_dir_path: str) -> bool:
+    """
+    Decompresses a compressed tar archive in a separate process, such as pigz, and extracts the
+    decompressed stream in this process, so that decompression and extraction run on different
+    CPUs. Returns False if this is not possible or would not help, i.e. there is only one CPU or no
+    suitable decompressor is installed.
+    """
+    if (os.cpu_count() or 1) < 2:
+        return False
+    command = get_decompressor_command(archive_extension)
+    if command is None:
+        return False
+
+    import subprocess
+
+    process = subprocess.Popen(
+        command + [archive_path], stdout=subprocess.PIPE, bufsize=BUFFER_SIZE_BYTES)
+    assert process.stdout is not None
+    try:
+        with process.stdout as decompressed_stream:
+            extract_tar_stream(decompressed_stream, dest_dir_path)  # type: ignore
+            # Read the rest of the output, e.g. padding after the end of the tar archive, so that
+            # the decompressor does not fail with a broken pipe.
+            while decompressed_stream.read(BUFFER_SIZE_BYTES):
+                pass
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    exit_code = process.wait()
+    if exit_code != 0:
+        raise IOError("Command %s failed with exit code %d when decompressing %s" % (
+            command, exit_code, archive_path))
+    return True
+
+
+def extract_archive(archive_path: str, dest_dir_path: str) -> None:
+    """
+    Extracts an archive into the given directory. The archive type is determined by the extension
+    of the file name. libarchive is used if it is installed. Otherwise, a separate decompressor
+    process is used if there are multiple CPUs.
+    """
+    archive_extension = get_archive_extension(os.path.basename(archive_path))
+    if archive_extension is None:
+        raise ValueError("Unsupported archive type: %s" % archive_path)
+    if extract_archive_with_libarchive(archive_path, dest_dir_path):
+        return
+    if extract_archive_with_decompressor_process(archive_path, archive_extension, dest_dir_path):
+        return
+    with open(archive_path, 'rb', buffering=0) as raw_archive_file:
+        with io.BufferedReader(raw_archive_file, buffer_size=BUFFER_SIZE_BYTES) as archive_file:
+            extract_archive_stream(archive_file, archive_extension, dest_dir_path)
@@ -0,0 +1,67 @@
+# Copyright (c) Yugabyte, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import io
+import os
+import pathlib
+import tempfile
+import unittest
+
+from unittest import mock
+
+from llvm_installer.download import (
+    DOWNLOAD_TIMEOUT_SEC,
+    ChecksumMismatchError,
+    QueueReader,
+    check_sha256,
+    download_file,
+    open_url,
+)
+
+
+class DownloadTest(unittest.TestCase):
+    def test_download_file(self) -> None:
+        data = bytes(range(256)) * 10000
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            src_path = os.path.join(tmp_dir, 'yb-llvm-test.tar.gz')
+            with open(src_path, 'wb') as output_file:
+                output_file.write(data)
+            url = pathlib.Path(src_path).as_uri()
+            dest_path = os.path.join(tmp_dir, 'downloaded.tar.gz')
+
+            self.assertEqual(hashlib.sha256(data).hexdigest(), download_file(url, dest_path))
+            with open(dest_path, 'rb') as input_file:
+                self.assertEqual(data, input_file.read())
+
+    def test_open_url_timeout(self) -> None:
+        with mock.patch('urllib.request.urlopen') as urlopen_mock:
+            open_url('https://example.com/a.tar.gz')
+            self.assertEqual(DOWNLOAD_TIMEOUT_SEC, urlopen_mock.call_args[1]['timeout'])
+
+    def test_check_sha256(self) -> None:
+        check_sha256('https://example.com/a.tar.gz', 'abc', 'abc')
+        with self.assertRaises(ChecksumMismatchError):
+            check_sha256('https://example.com/a.tar.gz', 'abc', 'def')
+
+    def test_queue_reader(self) -> None:
+        data = bytes(range(256)) * 100
+        with QueueReader(io.BytesIO(data), chunk_size=100, max_queued_chunks=2) as reader:
+            self.assertEqual(data, io.BufferedReader(reader).read())
+            self.assertEqual(hashlib.sha256(data).hexdigest(), reader.read_to_end_and_get_sha256())
+
+    def test_queue_reader_closed_early(self) -> None:
+        data = bytes(range(256)) * 100
+        reader = QueueReader(io.BytesIO(data), chunk_size=100, max_queued_chunks=2)
+        self.assertEqual(data[:10], reader.read(10))
+        reader.close()
+        self.assertFalse(reader.thread.is_alive())
@@ -0,0 +1,212 @@
+# Copyright (c) Yugabyte, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from typing import List, Optional, Tuple
+
+from unittest import mock
+
+from llvm_installer.download import QueueReader
+from llvm_installer.extraction import (
+    extract_archive,
+    extract_tar_gz_stream,
+    get_decompressor_command,
+)
+
+
+def create_test_archive(archive_path: str, top_dir_name: str) -> None:
+    with tempfile.TemporaryDirectory() as src_dir:
+        top_dir = os.path.join(src_dir, top_dir_name)
+        os.makedirs(os.path.join(top_dir, 'bin'))
+        os.makedirs(os.path.join(top_dir, 'lib', 'clang', '14.0.6', 'include'))
+        with open(os.path.join(top_dir, 'bin', 'clang-14'), 'wb') as output_file:
+            output_file.write(b'\x7fELF' + bytes(range(256)) * 4096)
+        os.chmod(os.path.join(top_dir, 'bin', 'clang-14'), 0o755)
+        os.symlink('clang-14', os.path.join(top_dir, 'bin', 'clang'))
+        os.link(os.path.join(top_dir, 'bin', 'clang-14'), os.path.join(top_dir, 'bin', 'clang++'))
+        with open(os.path.join(
+                top_dir, 'lib', 'clang', '14.0.6', 'include', 'stddef.h'), 'w') as output_file:
+            output_file.write('#pragma once\n')
+        mode = 'w:' + archive_path.split('.tar')[-1].lstrip('.')
+        with tarfile.open(archive_path, mode) as tar_file:  # type: ignore
+            tar_file.add(top_dir, arcname=top_dir_name)
+
+
+class ExtractionTest(unittest.TestCase):
+    def test_extract_archive(self) -> None:
+        self.check_extract_archive()
+
+    def test_extract_archive_with_writer_threads(self) -> None:
+        with mock.patch('os.cpu_count', return_value=4):
+            self.check_extract_archive()
+
+    def test_extract_tar_xz_archive(self) -> None:
+        self.check_extract_archive('.tar.xz')
+
+    def test_extract_tar_archive(self) -> None:
+        self.check_extract_archive('.tar')
+
+    def test_extract_archive_with_decompressor_process(self) -> None:
+        for archive_extension in ['.tar.gz', '.tar.xz']:
+            if get_decompressor_command(archive_extension) is None:
+                continue
+            with mock.patch('os.cpu_count', return_value=4):
+                with mock.patch(
+                        'llvm_installer.extraction.extract_archive_with_libarchive',
+                        return_value=False):
+                    self.check_extract_archive(archive_extension)
+
+    def test_get_decompressor_command(self) -> None:
+        with mock.patch('shutil.which', side_effect=lambda name: name != 'pigz'):
+            self.assertIsNone(get_decompressor_command('.tar.gz'))
+            self.assertEqual(['xz', '-dc', '-T0'], get_decompressor_command('.tar.xz'))
+        with mock.patch('shutil.which', return_value=True):
+            self.assertEqual(['pigz', '-dc'], get_decompressor_command('.tar.gz'))
+        self.assertIsNone(get_decompressor_command('.zip'))
+
+    def check_extract_archive(self, archive_extension: str = '.tar.gz') -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, 'yb-llvm-test' + archive_extension)
+            create_test_archive(archive_path, 'yb-llvm-test')
+            dest_dir = os.path.join(tmp_dir, 'dest')
+            os.mkdir(dest_dir)
+            extract_archive(archive_path, dest_dir)
+
+            top_dir = os.path.join(dest_dir, 'yb-llvm-test')
+            clang_path = os.path.join(top_dir, 'bin', 'clang-14')
+            with open(clang_path, 'rb') as input_file:
+                self.assertEqual(b'\x7fELF' + bytes(range(256)) * 4096, input_file.read())
+            self.assertTrue(os.access(clang_path, os.X_OK))
+            self.assertEqual('clang-14', os.readlink(os.path.join(top_dir, 'bin', 'clang')))
+            self.assertTrue(os.path.samefile(
+                clang_path, os.path.join(top_dir, 'bin', 'clang++')))
+            with open(os.path.join(
+                    top_dir, 'lib', 'clang', '14.0.6', 'include', 'stddef.h')) as input_file:
+                self.assertEqual('#pragma once\n', input_file.read())
+
+    def test_extract_tar_gz_stream_from_queue_reader(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, 'yb-llvm-test.tar.gz')
+            create_test_archive(archive_path, 'yb-llvm-test')
+            with open(archive_path, 'rb') as input_file:
+                archive_bytes = input_file.read()
+            dest_dir = os.path.join(tmp_dir, 'dest')
+            os.mkdir(dest_dir)
+
+            with QueueReader(
+                    io.BytesIO(archive_bytes), chunk_size=1000, max_queued_chunks=2) as reader:
+                extract_tar_gz_stream(io.BufferedReader(reader), dest_dir)
+                self.assertEqual(
+                    hashlib.sha256(archive_bytes).hexdigest(), reader.read_to_end_and_get_sha256())
+            self.assertEqual(
+                'clang-14', os.readlink(os.path.join(dest_dir, 'yb-llvm-test', 'bin', 'clang')))
+
+    def test_refuse_members_outside_dest_dir(self) -> None:
+        for members in [
+                [('../evil', tarfile.REGTYPE, '')],
+                [('yb-llvm-test/../../evil', tarfile.REGTYPE, '')],
+                [('yb-llvm-test/evil', tarfile.SYMTYPE, '../../evil')],
+                [('yb-llvm-test/evil', tarfile.SYMTYPE, '/etc/passwd')],
+                [('yb-llvm-test/evil', tarfile.LNKTYPE, '../evil')],
+                # Each symlink points inside of the destination directory by itself, but x/y
+                # resolves to the parent of the destination directory.
+                [('x', tarfile.SYMTYPE, '.'),
+                 ('x/y', tarfile.SYMTYPE, '..'),
+                 ('x/y/evil', tarfile.REGTYPE, '')]]:
+            for num_cpus in [1, 4]:
+                # Check both our own path checks and, if available, tarfile.tar_filter.
+                for hide_tar_filter in [True, False]:
+                    with self.subTest(members=members, num_cpus=num_cpus,
+                                      hide_tar_filter=hide_tar_filter):
+                        self.check_extract_members(members, num_cpus, hide_tar_filter)
+
+    def test_strip_leading_slashes(self) -> None:
+        for num_cpus in [1, 4]:
+            for hide_tar_filter in [True, False]:
+                with self.subTest(num_cpus=num_cpus, hide_tar_filter=hide_tar_filter):
+                    self.check_extract_members(
+                        [('/evil', tarfile.REGTYPE, '')], num_cpus, hide_tar_filter,
+                        expected_paths=['evil'])
+
+    def check_extract_members(
+            self,
+            members: List[Tuple[str, bytes, str]],
+            num_cpus: int,
+            hide_tar_filter: bool,
+            expected_paths: Optional[List[str]] = None) -> None:
+        """
+        Extracts an archive with the given members, and checks that either it is refused, or only
+        the expected paths are extracted, and that nothing is written outside of the destination.
+        """
+        archive_stream = io.BytesIO()
+        with tarfile.open(fileobj=archive_stream, mode='w:gz') as tar_file:
+            for member_name, member_type, link_name in members:
+                tar_info = tarfile.TarInfo(member_name)
+                tar_info.type = member_type
+                tar_info.linkname = link_name
+                tar_file.addfile(tar_info, io.BytesIO(b''))
+        archive_stream.seek(0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dest_dir = os.path.join(tmp_dir, 'a', 'dest')
+            os.makedirs(dest_dir)
+            with mock.patch.dict(vars(tarfile)), mock.patch('os.cpu_count', return_value=num_cpus):
+                if hide_tar_filter:
+                    vars(tarfile).pop('tar_filter', None)
+                if expected_paths is None:
+                    with self.assertRaises(tarfile.TarError):
+                        extract_tar_gz_stream(archive_stream, dest_dir)
+                else:
+                    extract_tar_gz_stream(archive_stream, dest_dir)
+                    self.assertEqual(expected_paths, os.listdir(dest_dir))
+            self.assertEqual(['a'], os.listdir(tmp_dir))
+            self.assertEqual(['dest'], os.listdir(os.path.join(tmp_dir, 'a')))
+
+    def test_refuse_tar_archive_member_outside_dest_dir(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, 'yb-llvm-test.tar')
+            with tarfile.open(archive_path, 'w:') as tar_file:
+                tar_file.addfile(tarfile.TarInfo('../evil'), io.BytesIO(b''))
+            dest_dir = os.path.join(tmp_dir, 'dest')
+            os.mkdir(dest_dir)
+            with mock.patch(
+                    'llvm_installer.extraction.extract_archive_with_libarchive',
+                    return_value=False):
+                with self.assertRaises(tarfile.TarError):
+                    extract_archive(archive_path, dest_dir)
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, 'evil')))
+
+    def test_extract_zip_archive(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = os.path.join(tmp_dir, 'yb-llvm-test.zip')
+            with zipfile.ZipFile(archive_path, 'w') as zip_file:
+                zip_info = zipfile.ZipInfo('yb-llvm-test/bin/clang-14')
+                zip_info.external_attr = 0o755 << 16
+                zip_file.writestr(zip_info, b'\x7fELF')
+            dest_dir = os.path.join(tmp_dir, 'dest')
+            os.mkdir(dest_dir)
+            extract_archive(archive_path, dest_dir)
+
+            clang_path = os.path.join(dest_dir, 'yb-llvm-test', 'bin', 'clang-14')
+            with open(clang_path, 'rb') as input_file:
+                self.assertEqual(b'\x7fELF', input_file.read())
+            self.assertTrue(os.access(clang_path, os.X_OK))
+
+    def test_extract_unsupported_archive(self) -> None:
+        with self.assertRaises(ValueError):
+            extract_archive('yb-llvm-test.rar', '.')
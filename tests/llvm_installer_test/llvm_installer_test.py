@@ -11,15 +11,148 @@
 # under the License.
 
 import os
+import sys
+import tempfile
 import unittest
 
-from llvm_installer import LlvmPackageCollection, LlvmInstaller
+from typing import List
+from unittest import mock
+
+from llvm_installer import LlvmPackageCollection, LlvmInstaller, ParsedTag, TagParsingError
 
 
 class LlvmInstallerTest(unittest.TestCase):
     def test_package_collection(self) -> None:
         pkg_collection = LlvmPackageCollection.get_instance()
 
+    def test_package_collection_cache(self) -> None:
+        pkg_collection = LlvmPackageCollection.get_instance()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, 'release_tags.pkl')
+            self.assertIsNone(LlvmPackageCollection.load_from_cache(cache_path, (1, 2)))
+            pkg_collection.save_to_cache(cache_path, (1, 2))
+            loaded_collection = LlvmPackageCollection.load_from_cache(cache_path, (1, 2))
+            assert loaded_collection is not None
+            self.assertEqual(
+                [parsed_tag.as_dict() for parsed_tag in pkg_collection.parsed_tags],
+                [parsed_tag.as_dict() for parsed_tag in loaded_collection.parsed_tags])
+            for parsed_tag in loaded_collection.parsed_tags:
+                self.assertIs(sys.intern(parsed_tag.architecture), parsed_tag.architecture)
+                self.assertIs(
+                    sys.intern(parsed_tag.short_os_name_and_version),
+                    parsed_tag.short_os_name_and_version)
+            self.assertIsNone(LlvmPackageCollection.load_from_cache(cache_path, (1, 3)))
+
+    def test_parse_tag(self) -> None:
+        parsed_tag = ParsedTag.from_tag('v12.0.1-yb-1-1651704621-bdb147e6-ubuntu20.04-x86_64')
+        self.assertEqual('12.0.1', parsed_tag.version)
+        self.assertEqual('yb-1', parsed_tag.version_suffix)
+        self.assertEqual(1, parsed_tag.yb_suffix_version)
+        self.assertEqual('1651704621', parsed_tag.timestamp)
+        self.assertEqual('bdb147e6', parsed_tag.sha1_prefix)
+        self.assertEqual('ubuntu20.04', parsed_tag.short_os_name_and_version)
+        self.assertEqual('x86_64', parsed_tag.architecture)
+        self.assertFalse(parsed_tag.is_old_tag_without_os_and_arch)
+
+        parsed_tag = ParsedTag.from_tag('v14.0.3-1653463652-1f914006-opensuse-leap15.3-aarch64')
+        self.assertIsNone(parsed_tag.version_suffix)
+        self.assertEqual('opensuse-leap15.3', parsed_tag.short_os_name_and_version)
+        self.assertEqual('aarch64', parsed_tag.architecture)
+
+        parsed_tag = ParsedTag.from_tag('v11.1.0-1617484806-1fdec59b-static')
+        self.assertTrue(parsed_tag.is_old_tag_without_os_and_arch)
+        self.assertEqual('centos7', parsed_tag.short_os_name_and_version)
+        self.assertEqual('x86_64', parsed_tag.architecture)
+
+        with self.assertRaises(TagParsingError):
+            ParsedTag.from_tag('v12.0.1-centos7-x86_64')
+
+    def test_compat_tag_regexes(self) -> None:
+        import llvm_installer
+        tag = 'v12.0.1-yb-1-1651704621-bdb147e6-ubuntu20.04-x86_64'
+        m = llvm_installer.TAG_RE.match(tag)
+        assert m is not None
+        self.assertEqual('ubuntu20.04', m.group('short_os_name_and_version'))
+        self.assertIsNone(llvm_installer.TAG_RE.match(tag + '-static'))
+        self.assertIsNotNone(
+            llvm_installer.TAG_RE_WITHOUT_OS_AND_ARCH.match('v11.1.0-1617470305-1fdec59b'))
+
+    def test_filter(self) -> None:
+        pkg_collection = LlvmPackageCollection.from_tags([
+            'v13.0.1-1645000000-abcdef01-centos7-x86_64',
+            'v13.0.1-yb-1-1645000000-abcdef01-almalinux8-x86_64',
+            'v13.0.1-1645000000-abcdef01-almalinux8-x86_64',
+            'v13.0.1-1645000000-abcdef01-almalinux8-aarch64',
+            'v12.0.1-1645000000-abcdef01-almalinux8-x86_64',
+        ])
+        filtered = pkg_collection.filter(
+            major_llvm_version=13,
+            short_os_name_and_version='centos8',
+            architecture='x86_64')
+        # The filtered tags are sorted by version.
+        self.assertEqual(
+            ['v13.0.1-1645000000-abcdef01-almalinux8-x86_64',
+             'v13.0.1-yb-1-1645000000-abcdef01-almalinux8-x86_64'],
+            [parsed_tag.tag for parsed_tag in filtered.parsed_tags])
+        self.assertEqual([], pkg_collection.filter(
+            major_llvm_version=14,
+            short_os_name_and_version='centos8',
+            architecture='x86_64').parsed_tags)
+
+    def test_get_url_for_tag(self) -> None:
+        installer = LlvmInstaller(
+            short_os_name_and_version='centos7',
+            architecture='x86_64',
+            github_release_url_prefix='https://example.com/releases%2F/')
+        tag = 'v14.0.3-1651810360-1f914006-centos7-x86_64'
+        self.assertEqual(
+            f'https://example.com/releases%2F/{tag}/yb-llvm-{tag}.tar.gz',
+            installer.get_url_for_tag(tag))
+
+    def use_package_collection(self, tags: List[str]) -> None:
+        self.addCleanup(
+            setattr, LlvmPackageCollection, '_instance', LlvmPackageCollection._instance)
+        LlvmPackageCollection._instance = LlvmPackageCollection.from_tags(tags)
+
+    def test_get_parsed_tag_highest_version(self) -> None:
+        self.use_package_collection([
+            'v14.0.6-1656800000-abc12345-centos7-x86_64',
+            'v14.0.6-yb-2-1656900000-abc12345-centos7-x86_64',
+            'v14.0.3-1651810360-1f914006-centos7-x86_64',
+            'v14.0.6-yb-1-1657000000-abc12345-centos7-x86_64',
+            'v14.0.6-yb-3-1656700000-abc12345-centos7-aarch64',
+            'v15.0.3-1667000000-abc12345-centos7-x86_64',
+        ])
+        installer = LlvmInstaller(short_os_name_and_version='centos7', architecture='x86_64')
+        self.assertEqual(
+            'v14.0.6-yb-2-1656900000-abc12345-centos7-x86_64',
+            installer.get_parsed_tag(major_llvm_version=14).tag)
+
+    def test_get_parsed_tag_tie(self) -> None:
+        self.use_package_collection([
+            'v14.0.3-1651810360-1f914006-centos7-x86_64',
+            'v14.0.6-1656800000-abc12345-centos7-x86_64',
+            'v14.0.6-1656800000-def67890-centos7-x86_64',
+        ])
+        installer = LlvmInstaller(short_os_name_and_version='centos7', architecture='x86_64')
+        with self.assertRaisesRegex(ValueError, 'Multiple packages found'):
+            installer.get_parsed_tag(major_llvm_version=14)
+
+    def test_get_parsed_tag_single_candidate(self) -> None:
+        self.use_package_collection([
+            'v14.0.6-1656800000-abc12345-centos8-x86_64',
+            'v14.0.6-1656800000-abc12345-centos8-aarch64',
+            'v15.0.3-1667000000-abc12345-centos8-x86_64',
+        ])
+        installer = LlvmInstaller(short_os_name_and_version='almalinux8', architecture='x86_64')
+        # The only candidate for this major version and architecture is returned without
+        # filtering the collection.
+        with mock.patch.object(
+                LlvmPackageCollection, 'filter', side_effect=AssertionError('Not the fast path')):
+            self.assertEqual(
+                'v14.0.6-1656800000-abc12345-centos8-x86_64',
+                installer.get_parsed_tag(major_llvm_version=14).tag)
+
     def test_get_url(self) -> None:
         for major_llvm_version in [12, 13, 14]:
             for short_os_name_and_version in ['centos7', 'almalinux8', 'amzn2', 'centos8']:
@@ -0,0 +1,132 @@
+# Copyright (c) Yugabyte, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import io
+import os
+import pathlib
+import tarfile
+import tempfile
+import unittest
+
+from typing import Optional
+
+from unittest import mock
+
+from llvm_installer.__main__ import download_and_extract, install, parse_print_url_args
+from llvm_installer.download import ChecksumMismatchError
+
+
+def create_test_package(server_dir: str, clang_data: bytes, sha256: Optional[str] = None) -> str:
+    """
+    Creates an LLVM package and its checksum file in the given directory, and returns the file URL
+    of the package. The checksum file contains the given checksum instead of the correct one if
+    specified.
+    """
+    archive_path = os.path.join(server_dir, 'yb-llvm-test.tar.gz')
+    with tarfile.open(archive_path, 'w:gz') as tar_file:
+        tar_info = tarfile.TarInfo('yb-llvm-test/bin/clang')
+        tar_info.size = len(clang_data)
+        tar_info.mode = 0o755
+        tar_file.addfile(tar_info, io.BytesIO(clang_data))
+    if sha256 is None:
+        with open(archive_path, 'rb') as input_file:
+            sha256 = hashlib.sha256(input_file.read()).hexdigest()
+    with open(archive_path + '.sha256', 'w') as output_file:
+        output_file.write(f'{sha256}  yb-llvm-test.tar.gz\n')
+    return pathlib.Path(archive_path).as_uri()
+
+
+class MainTest(unittest.TestCase):
+    def test_parse_print_url_args(self) -> None:
+        self.assertEqual(14, parse_print_url_args(['--llvm-major-version', '14', 'print-url']))
+        self.assertEqual(12, parse_print_url_args(['--major-version', '12', '--print-url']))
+        self.assertEqual(14, parse_print_url_args(['--llvm-major-version=14', 'print-url']))
+        self.assertEqual(12, parse_print_url_args(['--major-version=12', '--print-url']))
+
+    def test_parse_print_url_args_fallback(self) -> None:
+        for args in [
+                [],
+                ['print-url'],
+                ['--llvm-major-version', '14', 'install'],
+                ['--llvm-major-version', '14', 'print-url', '--verbose'],
+                ['--llvm-major-version=14', '14', 'print-url'],
+                ['--llvm-major-version', '0', 'print-url'],
+                ['--llvm-major-version=0', 'print-url'],
+                ['--llvm-major-version', '-14', 'print-url'],
+                ['--llvm-major-version', '14.0', 'print-url'],
+                ['--llvm-major-version=', 'print-url'],
+                ['--llvm-major-version', '14', 'print-urls'],
+                ['--verbose=14', 'print-url']]:
+            with self.subTest(args=args):
+                self.assertIsNone(parse_print_url_args(args))
+
+
+class InstallTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir_obj = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir_obj.cleanup)
+        self.server_dir = os.path.join(self.tmp_dir_obj.name, 'server')
+        self.install_parent_dir = os.path.join(self.tmp_dir_obj.name, 'llvm')
+        os.mkdir(self.server_dir)
+        os.mkdir(self.install_parent_dir)
+        self.install_dir = os.path.join(self.install_parent_dir, 'yb-llvm-test')
+
+    def read_installed_clang(self) -> bytes:
+        with open(os.path.join(self.install_dir, 'bin', 'clang'), 'rb') as input_file:
+            return input_file.read()
+
+    def test_download_and_extract(self) -> None:
+        url = create_test_package(self.server_dir, b'clang 1')
+        download_and_extract(url, '.tar.gz', self.install_parent_dir)
+        self.assertEqual(b'clang 1', self.read_installed_clang())
+        self.assertEqual(['yb-llvm-test'], os.listdir(self.install_parent_dir))
+
+    def test_download_and_extract_over_existing_installation(self) -> None:
+        os.makedirs(os.path.join(self.install_dir, 'bin'))
+        with open(os.path.join(self.install_dir, 'stale_file'), 'w'):
+            pass
+        url = create_test_package(self.server_dir, b'clang 2')
+        download_and_extract(url, '.tar.gz', self.install_parent_dir)
+        self.assertEqual(b'clang 2', self.read_installed_clang())
+        self.assertEqual(['bin'], os.listdir(self.install_dir))
+        self.assertEqual(['yb-llvm-test'], os.listdir(self.install_parent_dir))
+
+    def test_download_and_extract_checksum_mismatch(self) -> None:
+        url = create_test_package(self.server_dir, b'clang 1')
+        download_and_extract(url, '.tar.gz', self.install_parent_dir)
+        url = create_test_package(self.server_dir, b'clang 2', sha256='0' * 64)
+        with self.assertRaises(ChecksumMismatchError):
+            download_and_extract(url, '.tar.gz', self.install_parent_dir)
+        self.assertEqual(b'clang 1', self.read_installed_clang())
+        self.assertEqual(['yb-llvm-test'], os.listdir(self.install_parent_dir))
+
+    def test_install_falls_back_to_downloading_to_disk(self) -> None:
+        url = create_test_package(self.server_dir, b'clang 1')
+        with mock.patch('llvm_installer.__main__.INSTALL_PARENT_DIR', self.install_parent_dir):
+            with mock.patch(
+                    'llvm_installer.__main__.download_and_extract',
+                    side_effect=ChecksumMismatchError('Invalid checksum')):
+                with self.assertLogs('llvm_installer.__main__', level='WARNING'):
+                    install(url, once=False, verbose=False)
+        self.assertEqual(b'clang 1', self.read_installed_clang())
+        self.assertTrue(
+            os.path.exists(os.path.join(self.install_dir, '.llvm_installation_finished')))
+        self.assertEqual(['yb-llvm-test'], os.listdir(self.install_parent_dir))
+
+    def test_install_checksum_mismatch(self) -> None:
+        url = create_test_package(self.server_dir, b'clang 1', sha256='0' * 64)
+        with mock.patch('llvm_installer.__main__.INSTALL_PARENT_DIR', self.install_parent_dir):
+            with self.assertRaises(ChecksumMismatchError), \
+                    self.assertLogs('llvm_installer.__main__', level='WARNING'):
+                install(url, once=False, verbose=False)
+        self.assertEqual([], os.listdir(self.install_parent_dir))
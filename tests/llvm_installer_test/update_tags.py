@@ -15,12 +15,51 @@
 import os
 import logging
 import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 from llvm_installer import LlvmInstaller, ParsedTag, TagParsingError, get_release_tags_file_path
 
 from github import Github, GithubException
 from github.GitRelease import GitRelease
 
+from typing import Callable, Set, Tuple, TypeVar
+
+
+# Listing the assets of a release is a separate GitHub API request for every release.
+MAX_PARALLEL_REQUESTS = 16
+
+MAX_ATTEMPTS = 5
+INITIAL_RETRY_DELAY_SEC = 1.0
+
+T = TypeVar('T')
+
+
+def call_with_retries(fn: Callable[[], T]) -> T:
+    """
+    Calls the given function, retrying with exponential backoff when GitHub responds with HTTP
+    status 403, which is what it does when the API rate limit is exceeded.
+    """
+    delay_sec = INITIAL_RETRY_DELAY_SEC
+    for attempt_index in range(1, MAX_ATTEMPTS):
+        try:
+            return fn()
+        except GithubException as ex:
+            if ex.status != 403:
+                raise
+            logging.warning(
+                "GitHub API request failed (attempt %d of %d), retrying in %.1f sec: %s",
+                attempt_index, MAX_ATTEMPTS, delay_sec, ex)
+            time.sleep(delay_sec)
+            delay_sec *= 2
+    return fn()
+
+
+def get_download_urls(release: GitRelease) -> Tuple[GitRelease, Set[str]]:
+    return release, call_with_retries(
+        lambda: {asset.browser_download_url for asset in release.get_assets()})
+
 
 def main() -> None:
     github_token_file_path = os.path.expanduser('~/.github-token')
@@ -37,15 +76,16 @@ def main() -> None:
     if not os.path.isdir(os.path.dirname(output_path)):
         raise IOError(f"Directory of the output file {output_path} does not exist")
 
-    for release in repo.get_releases():
+    releases = call_with_retries(lambda: list(repo.get_releases()))
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as executor:
+        releases_and_download_urls = list(executor.map(get_download_urls, releases))
 
+    for release, download_urls in releases_and_download_urls:
         tag_name = release.tag_name
         url_for_tag = installer.get_url_for_tag(tag_name)
+        sha256_url = url_for_tag + '.sha256'
 
-        download_urls = []
-        for asset in release.get_assets():
-            download_urls.append(asset.browser_download_url)
-        if url_for_tag in download_urls and url_for_tag + '.sha256' in download_urls:
+        if url_for_tag in download_urls and sha256_url in download_urls:
             logging.info("Found release: %s", url_for_tag)
             try:
                 parsed_tag = ParsedTag.from_tag(tag_name)
@@ -65,8 +105,15 @@ def main() -> None:
     valid_tags.sort(key=lambda parsed_tag: parsed_tag.get_sort_key())
     json_data = {"parsed_tags": [valid_tag.as_dict() for valid_tag in valid_tags]}
 
-    with open(output_path, 'w') as output_file:
-        output_file.write(json.dumps(json_data, sort_keys=True, indent=2) + '\n')
+    try:
+        import orjson  # type: ignore
+        json_bytes = orjson.dumps(json_data, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2)
+    except ImportError:
+        # Produces the same output as orjson, only slower.
+        json_bytes = json.dumps(json_data, sort_keys=True, indent=2).encode('utf-8')
+
+    with open(output_path, 'wb') as output_file:
+        output_file.write(json_bytes + b'\n')
     logging.info(f"Wrote {len(valid_tags)} releases to file: {output_path}")
 
 